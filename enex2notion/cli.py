@@ -1,60 +1,111 @@
 import argparse
 import logging
+import os
+import random
 import sys
+import threading
 import warnings
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    FIRST_EXCEPTION,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional
 
-from enex2notion.cli_wkhtmltopdf import ensure_wkhtmltopdf
+from enex2notion.done_file import DoneFile
 from enex2notion.enex_parser import iter_notes
-from enex2notion.enex_uploader import (
-    BadTokenException,
-    NoteUploadFailException,
-    get_import_root,
-    get_notion_client,
-    upload_note,
-)
-from enex2notion.enex_uploader_modes import get_notebook_database, get_notebook_page
-from enex2notion.note_parser import parse_note
 from enex2notion.version import __version__
 
 logger = logging.getLogger(__name__)
 
 
-class DoneFile(object):
-    def __init__(self, path: Path):
-        self.path = path
-
-        try:
-            with open(path, "r") as f:
-                self.done_hashes = {line.strip() for line in f}
-        except FileNotFoundError:
-            self.done_hashes = set()
-
-    def __contains__(self, note_hash):
-        return note_hash in self.done_hashes
-
-    def add(self, note_hash):
-        self.done_hashes.add(note_hash)
+def _upload_note(
+    notebook_root,
+    note,
+    note_blocks,
+    stop_event,
+    upload_concurrency=1,
+    retry_base=0.5,
+    retry_cap=30,
+    show_progress=True,
+):
+    # Heavy modules (notion, bs4, fitz) are imported only when needed
+    # to keep --help and dry runs fast
+    from enex2notion.enex_uploader import NoteUploadFailException, upload_note
 
-        with open(self.path, "a") as f:
-            f.write(f"{note_hash}\n")
-
-
-def _upload_note(notebook_root, note, note_blocks):
     for attempt in range(5):
         try:
-            upload_note(notebook_root, note, note_blocks)
-        except NoteUploadFailException:
+            upload_note(
+                notebook_root,
+                note,
+                note_blocks,
+                upload_concurrency=upload_concurrency,
+                show_progress=show_progress,
+            )
+        except NoteUploadFailException as e:
             if attempt == 4:
                 raise
+
+            delay = e.retry_after
+            if delay is None:
+                delay = min(retry_cap, retry_base * 2**attempt)
+                delay *= random.uniform(0.5, 1.5)  # noqa: S311
+            elif delay > retry_cap:
+                logger.info(
+                    "Notion asked to wait %.1fs before retry, limiting to %.1fs",
+                    delay,
+                    retry_cap,
+                )
+                delay = retry_cap
+
             logger.warning(
-                f"Failed to upload note '{note.title}' to Notion! Retrying..."
+                "Failed to upload note '%s' to Notion! Retrying in %.1fs...",
+                note.title,
+                delay,
             )
+
+            # Don't hold up an aborted run until the delay is over
+            if stop_event.wait(delay):
+                raise
             continue
         break
 
 
+class NotionClientPool(object):
+    """Separate Notion client for each upload running at the same time
+
+    notion-py keeps the open transaction on the client object,
+    so uploads sharing a client would mix their operations.
+    """
+
+    def __init__(self, token, pool_size=1):
+        self.token = token
+        self.pool_size = pool_size
+
+        self._free = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def client(self):
+        with self._lock:
+            client = self._free.pop() if self._free else None
+
+        if client is None:
+            from enex2notion.enex_uploader import get_notion_client
+
+            client = get_notion_client(self.token, pool_size=self.pool_size)
+
+        try:
+            yield client
+        finally:
+            with self._lock:
+                self._free.append(client)
+
+
 class EnexUploader(object):
     def __init__(
         self,
@@ -67,39 +118,160 @@ class EnexUploader(object):
         condense_lines: bool,
         condense_lines_sparse: bool,
         custom_tag: str,
+        workers: int = 1,
+        upload_concurrency: int = 1,
+        batch_size: int = 64,
+        max_in_flight: Optional[int] = None,
+        retry_base: float = 0.5,
+        retry_cap: float = 30,
+        clients: Optional[NotionClientPool] = None,
+        show_progress: bool = True,
     ):
         self.import_root = import_root
         self.mode = mode
         self.mode_webclips = mode_webclips
-        self.done_hashes = DoneFile(done_file) if done_file else set()
+        self.done_hashes = DoneFile(done_file, flush_every=batch_size)
         self.add_meta = add_meta
         self.add_pdf_preview = add_pdf_preview
         self.condense_lines = condense_lines
         self.condense_lines_sparse = condense_lines_sparse
         self.custom_tag = custom_tag
+        self.workers = workers
+        self.upload_concurrency = upload_concurrency
+        self.max_in_flight = max_in_flight or workers * 2
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.clients = clients
+
+        # Callers other than cli() may provide only the import root
+        if clients is None and import_root is not None:
+            self.clients = NotionClientPool(
+                import_root._client.session.cookies.get("token_v2"),  # noqa: WPS437
+                pool_size=upload_concurrency,
+            )
+
+        # Progress bars of notes uploaded at the same time would mix up
+        self.show_progress = show_progress and workers == 1
+
+        self._notebook_root_lock = threading.Lock()
+
+        # Hashes queued in this run, so duplicates are skipped
+        # even before their upload is finished and marked as done
+        self._run_seen = set()
+        self._run_seen_lock = threading.Lock()
+
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Stop queueing new notes in all running uploads"""
+
+        self._stopped.set()
 
     def upload(self, enex_file: Path):
         logger.info(f"Processing notebook '{enex_file.stem}'...")
 
-        notebook_root = self._get_notebook_root(enex_file.stem)
+        # Database cleanup may remove a notebook that is still being created
+        with self._notebook_root_lock:
+            notebook_root = self._get_notebook_root(enex_file.stem)
+
+        with self.done_hashes, ThreadPoolExecutor(self.workers) as executor:
+            pending = []
+
+            try:
+                for note in iter_notes(enex_file, skip_predicate=self._is_done):
+                    if self._stopped.is_set():
+                        break
+
+                    if self.custom_tag and self.custom_tag not in note.tags_set:
+                        note.tags.append(self.custom_tag)
+                        note.tags_set.add(self.custom_tag)
+
+                    # Parse here, so that the next note is parsed
+                    # while workers are waiting for Notion
+                    note_blocks = self._parse_note(note)
+                    if not note_blocks or notebook_root is None:
+                        continue
+
+                    # Keep only a few notes in memory ahead of the workers
+                    if len(pending) >= self.max_in_flight:
+                        self._collect_done(pending, FIRST_COMPLETED)
+
+                    pending.append(
+                        executor.submit(
+                            self._upload_note, notebook_root, note, note_blocks
+                        )
+                    )
+
+                self._collect_done(pending)
+            except BaseException:
+                # Files uploaded in parallel stop as well, the run is aborted
+                self.stop()
+
+                for future in pending:
+                    future.cancel()
+
+                # Uploads that were already running still finish,
+                # mark them as done so they are not duplicated on resume
+                self._save_finished(pending)
+                raise
+
+    def _is_done(self, note_hash, note_title):
+        if note_hash in self.done_hashes:
+            logger.debug("Skipping note '%s' (already uploaded)", note_title)
+            return True
+
+        with self._run_seen_lock:
+            if note_hash in self._run_seen:
+                logger.debug("Skipping note '%s' (duplicate)", note_title)
+                return True
 
-        for note in iter_notes(enex_file):
-            if note.note_hash in self.done_hashes:
-                logger.debug(f"Skipping note '{note.title}' (already uploaded)")
-                continue
+            self._run_seen.add(note_hash)
 
-            if self.custom_tag and self.custom_tag not in note.tags:
-                note.tags.append(self.custom_tag)
+        return False
 
-            note_blocks = self._parse_note(note)
-            if not note_blocks:
-                continue
+    def _collect_done(self, pending, return_when=ALL_COMPLETED):
+        """Mark finished uploads as done and remove them from pending"""
 
-            if notebook_root is not None:
-                _upload_note(notebook_root, note, note_blocks)
-                self.done_hashes.add(note.note_hash)
+        wait(pending, return_when=return_when)
+
+        done, not_done = [], []
+        for future in pending:
+            (done if future.done() else not_done).append(future)
+
+        pending[:] = not_done
+
+        self._save_finished(done)
+
+        # Raise only after all successful uploads are marked as done
+        for future in done:
+            future.result()
+
+    def _save_finished(self, futures):
+        wait(futures)
+
+        # Walk in submission order to keep done file order stable
+        for future in futures:
+            if not future.cancelled() and future.exception() is None:
+                self.done_hashes.add(future.result())
+
+    def _upload_note(self, notebook_root, note, note_blocks):
+        with self.clients.client() as client:
+            _upload_note(
+                client.get_block(notebook_root.id),
+                note,
+                note_blocks,
+                self._stopped,
+                upload_concurrency=self.upload_concurrency,
+                retry_base=self.retry_base,
+                retry_cap=self.retry_cap,
+                show_progress=self.show_progress,
+            )
+
+        return note.note_hash
 
     def _parse_note(self, note):
+        from enex2notion.note_parser import parse_note
+
         try:
             return parse_note(
                 note,
@@ -110,13 +282,18 @@ class EnexUploader(object):
                 is_condense_lines_sparse=self.condense_lines_sparse,
             )
         except Exception:
-            logger.error(f"Unhandled exception while parsing note '{note.title}'!")
+            logger.error("Unhandled exception while parsing note '%s'!", note.title)
             raise
 
     def _get_notebook_root(self, notebook_title):
         if self.import_root is None:
             return None
 
+        from enex2notion.enex_uploader_modes import (
+            get_notebook_database,
+            get_notebook_page,
+        )
+
         if self.mode == "DB":
             return get_notebook_database(self.import_root, notebook_title)
 
@@ -129,10 +306,17 @@ def cli(argv):
     _setup_logging(args.verbose, args.log)
 
     if args.mode_webclips == "PDF":
+        from enex2notion.cli_wkhtmltopdf import ensure_wkhtmltopdf
+
         ensure_wkhtmltopdf()
 
     root = get_root(args.token, args.root_page)
 
+    # Main client is used only for notebook lookups, uploads get their own
+    clients = None
+    if root is not None:
+        clients = NotionClientPool(args.token, pool_size=args.upload_concurrency)
+
     enex_uploader = EnexUploader(
         import_root=root,
         mode=args.mode,
@@ -143,15 +327,58 @@ def cli(argv):
         condense_lines=args.condense_lines,
         condense_lines_sparse=args.condense_lines_sparse,
         custom_tag=args.tag,
+        workers=args.workers,
+        upload_concurrency=args.upload_concurrency,
+        batch_size=args.batch_size,
+        max_in_flight=args.max_in_flight,
+        retry_base=args.retry_base,
+        retry_cap=args.retry_cap,
+        clients=clients,
+        show_progress=args.file_workers == 1,
     )
 
-    for enex_input in args.enex_input:
-        if enex_input.is_dir():
-            logger.info(f"Processing directory '{enex_input.name}'...")
-            for enex_file in sorted(enex_input.glob("**/*.enex")):
-                enex_uploader.upload(enex_file)
-        else:
-            enex_uploader.upload(enex_input)
+    # Keep done file open between notebooks, so its index is saved once
+    with enex_uploader.done_hashes:
+        for enex_input in args.enex_input:
+            if enex_input.is_dir():
+                logger.info(f"Processing directory '{enex_input.name}'...")
+                _upload_dir(enex_uploader, enex_input, args.file_workers)
+            else:
+                enex_uploader.upload(enex_input)
+
+
+def _upload_dir(enex_uploader, enex_dir: Path, file_workers: int):
+    with ThreadPoolExecutor(file_workers) as executor:
+        futures = [
+            executor.submit(enex_uploader.upload, Path(enex_file))
+            for enex_file in _iter_enex(enex_dir)
+        ]
+
+        try:
+            wait(futures, return_when=FIRST_EXCEPTION)
+
+            for future in futures:
+                if future.done():
+                    future.result()
+        except BaseException:
+            enex_uploader.stop()
+
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _iter_enex(root_dir):
+    """Recursively yield paths of *.enex files, sorted by name in each directory"""
+
+    with os.scandir(root_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _iter_enex(entry.path)
+        elif entry.name.lower().endswith(".enex") and entry.is_file():
+            yield entry.path
 
 
 def get_root(token, name):
@@ -161,6 +388,12 @@ def get_root(token, name):
         )
         return None
 
+    from enex2notion.enex_uploader import (
+        BadTokenException,
+        get_import_root,
+        get_notion_client,
+    )
+
     try:
         client = get_notion_client(token)
     except BadTokenException:
@@ -178,13 +411,17 @@ def main():  # pragma: no cover
 
 
 def parse_args(argv):
+    return _PARSER.parse_args(argv)
+
+
+def _build_parser():
     parser = argparse.ArgumentParser(
         prog="enex2notion", description="Uploads ENEX files to Notion"
     )
 
     schema = {
         "enex_input": {
-            "type": Path,
+            "type": _path_arg,
             "nargs": "+",
             "help": "ENEX files or directories to upload",
             "metavar": "FILE/DIR",
@@ -255,13 +492,69 @@ def parse_args(argv):
             "default": False,
             "help": "like --condense-lines but leaves gaps between paragraphs",
         },
+        "--workers": {
+            "type": _positive_int,
+            "default": 1,
+            "help": "number of notes to upload in parallel (default: 1)",
+            "metavar": "N",
+        },
+        "--max-in-flight": {
+            "type": _positive_int,
+            "help": (
+                "maximum number of parsed notes queued for upload,"
+                " higher values use more memory (default: 2 x workers)"
+            ),
+            "metavar": "N",
+        },
+        "--file-workers": {
+            "type": _positive_int,
+            "default": 1,
+            "help": (
+                "number of ENEX files from directory to upload in parallel"
+                " (default: 1)"
+            ),
+            "metavar": "N",
+        },
+        "--upload-concurrency": {
+            "type": _positive_int,
+            "default": 8,
+            "help": "number of files from a note to upload in parallel (default: 8)",
+            "metavar": "N",
+        },
+        "--retry-base": {
+            "type": _non_negative_float,
+            "default": 0.5,
+            "help": (
+                "initial delay in seconds before retrying failed note upload,"
+                " doubled on each attempt (default: 0.5)"
+            ),
+            "metavar": "SEC",
+        },
+        "--retry-cap": {
+            "type": _non_negative_float,
+            "default": 30,
+            "help": (
+                "maximum delay in seconds between upload retries,"
+                " including delays requested by Notion (default: 30)"
+            ),
+            "metavar": "SEC",
+        },
+        "--batch-size": {
+            "type": _positive_int,
+            "default": 64,
+            "help": (
+                "number of uploaded note hashes to buffer"
+                " before saving them to done file (default: 64)"
+            ),
+            "metavar": "N",
+        },
         "--done-file": {
-            "type": Path,
+            "type": _path_arg,
             "metavar": "FILE",
             "help": "file for uploaded notes hashes to resume interrupted upload",
         },
         "--log": {
-            "type": Path,
+            "type": _path_arg,
             "metavar": "FILE",
             "help": "file to store program log",
         },
@@ -279,7 +572,29 @@ def parse_args(argv):
     for arg, arg_params in schema.items():
         parser.add_argument(arg, **arg_params)
 
-    return parser.parse_args(argv)
+    return parser
+
+
+def _path_arg(path_str):
+    # Parser is shared, so resolve Path at parse time in case pathlib is patched
+    return Path(path_str)
+
+
+def _positive_int(value_str):
+    value = int(value_str)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be positive: {value_str}")
+    return value
+
+
+def _non_negative_float(value_str):
+    value = float(value_str)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {value_str}")
+    return value
+
+
+_PARSER = _build_parser()
 
 
 def _setup_logging(is_verbose: bool, log_file: Optional[Path]):
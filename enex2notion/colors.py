@@ -1,6 +1,6 @@
 import contextlib
 import re
-from functools import partial
+from functools import lru_cache, partial
 from math import sqrt
 from types import MappingProxyType
 
@@ -80,16 +80,13 @@ COLORS_BG = MappingProxyType(
 )
 
 
+@lru_cache(maxsize=1024)
 def extract_color(style):  # noqa: WPS210
-    color_map = {
-        ".*en-highlight$": _extract_background_text,
-        "^background-color$": _extract_background_rgb,
-        "^color$": _extract_foreground_rgb,
-    }
+    """Same style strings repeat on every span of a note, so results are cached"""
 
     for s_name, s_value in _parse_style(style).items():
-        for regex, color_extract_func in color_map.items():
-            if re.match(regex, s_name):
+        for regex, color_extract_func in _COLOR_MAP:
+            if regex.match(s_name):
                 color = color_extract_func(s_value)
                 if color:
                     return color
@@ -182,3 +179,10 @@ def _closest_color(colors, rgb):  # noqa: WPS210
         )
         color_diffs.append((color_diff, color_name))
     return min(color_diffs)[1]
+
+
+_COLOR_MAP = (
+    (re.compile(".*en-highlight$"), _extract_background_text),
+    (re.compile("^background-color$"), _extract_background_rgb),
+    (re.compile("^color$"), _extract_foreground_rgb),
+)
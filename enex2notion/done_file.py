@@ -0,0 +1,329 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Done files larger than this are indexed in SQLite instead of memory
+SQLITE_THRESHOLD = 10 * 1024 * 1024
+
+# Indexed start of the done file, to notice when it's replaced with another one
+FINGERPRINT_SIZE = 4096
+
+# SHA-1 hex digest and newline
+HASH_LINE_SIZE = 41
+
+
+class DoneFile(object):
+    def __init__(self, path: Optional[Path], flush_every: int = 64):
+        self.path = path
+        self.flush_every = flush_every
+
+        self._file = None
+        self._file_users = 0
+        self._unflushed = 0
+        self._lock = threading.RLock()
+
+        self.done_hashes = set()
+
+        if path is None:
+            return
+
+        try:
+            is_large = path.stat().st_size > SQLITE_THRESHOLD
+        except FileNotFoundError:
+            return
+
+        if is_large:
+            self.done_hashes = SqliteHashSet(path.with_name(f"{path.name}.db"))
+            self.done_hashes.sync(path)
+        else:
+            with open(path, "r") as f:
+                self.done_hashes = {line.strip() for line in f}
+
+    def __contains__(self, note_hash):
+        return note_hash in self.done_hashes
+
+    def __enter__(self):
+        with self._lock:
+            # Several notebooks may be uploaded at once, share the same handle
+            if self._file_users == 0 and self.path is not None:
+                self._file = open(self.path, "a", buffering=65536)
+
+            self._file_users += 1
+
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._file_users -= 1
+            if self._file_users > 0:
+                return
+
+            if self._file is not None:
+                self._flush()
+                self._file.close()
+                self._file = None
+
+            if isinstance(self.done_hashes, SqliteHashSet):
+                self.done_hashes.sync(self.path)
+                self.done_hashes.save_bloom()
+
+    def add(self, note_hash):
+        with self._lock:
+            self.done_hashes.add(note_hash)
+
+            if self.path is None:
+                return
+
+            if self._file is None:
+                with self:
+                    self._write(note_hash)
+            else:
+                self._write(note_hash)
+
+    def _write(self, note_hash):
+        self._file.write(f"{note_hash}\n")
+
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self._flush()
+
+    def _flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        if isinstance(self.done_hashes, SqliteHashSet):
+            self.done_hashes.commit()
+
+        self._unflushed = 0
+
+
+class SqliteHashSet(object):
+    """Set-like hash storage that keeps memory usage flat for huge done files
+
+    The plain text done file stays the source of truth, the database is only
+    an index that is caught up with the text file on open and close.
+    Lookups are fronted by a Bloom filter, so most new notes are rejected
+    without touching the database.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS done (h TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v INTEGER)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bloom"
+            " (id INTEGER PRIMARY KEY, capacity INTEGER, bits BLOB)"
+        )
+        self._db.commit()
+
+        self._count = self._get_meta("count")
+        self._bloom = self._load_bloom()
+        self._is_bloom_changed = False
+
+    def __contains__(self, note_hash):
+        with self._lock:
+            if self._bloom is not None and note_hash not in self._bloom:
+                return False
+
+            row = self._db.execute("SELECT 1 FROM done WHERE h=?", (note_hash,))
+            return row.fetchone() is not None
+
+    def add(self, note_hash):
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO done VALUES (?)", (note_hash,)
+            )
+            self._count += cur.rowcount
+
+            if self._bloom is not None and cur.rowcount:
+                self._bloom.add(note_hash)
+                self._is_bloom_changed = True
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def sync(self, path: Path):
+        """Index hashes appended to the text file since the last sync"""
+
+        with self._lock:
+            self._sync(path)
+
+    def save_bloom(self):
+        """Store Bloom filter to skip rebuilding it on next open
+
+        The filter can take hundreds of MB, so it's saved only when changed.
+        """
+
+        with self._lock:
+            if not self._is_bloom_changed:
+                return
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO bloom VALUES (0, ?, ?)",
+                (self._bloom.capacity, self._bloom.as_buffer()),
+            )
+
+            # Filter is valid only for the index state it was saved with
+            self._set_meta("bloom_offset", self._get_meta("offset"))
+            self._db.commit()
+
+            self._is_bloom_changed = False
+
+    def _sync(self, path: Path):
+        offset = self._get_meta("offset")
+
+        with open(path, "rb") as f:
+            file_stat = os.fstat(f.fileno())
+
+            if not self._is_same_file(f, file_stat, offset):
+                logger.debug("Done file was replaced, rebuilding index")
+                self._db.execute("DELETE FROM done")
+                self._count = 0
+                self._bloom = None
+                offset = 0
+
+            expected_count = (
+                self._count + (file_stat.st_size - offset) // HASH_LINE_SIZE
+            )
+            if self._bloom is None or expected_count > self._bloom.capacity:
+                self._rebuild_bloom(expected_count)
+
+            f.seek(offset)
+
+            cur = self._db.executemany(
+                "INSERT OR IGNORE INTO done VALUES (?)", self._iter_new_hashes(f)
+            )
+            self._count += cur.rowcount
+            if cur.rowcount:
+                self._is_bloom_changed = True
+
+            end_offset = f.tell()
+
+            self._set_meta("offset", end_offset)
+            self._set_meta("inode", file_stat.st_ino)
+            self._set_meta("head", _head_hash(f, min(end_offset, FINGERPRINT_SIZE)))
+
+        # Estimate was too low, keep false positive rate in check
+        if self._count > self._bloom.capacity:
+            self._rebuild_bloom(self._count)
+
+        self._set_meta("count", self._count)
+
+        self._db.commit()
+
+    def _is_same_file(self, f, file_stat, offset):
+        if offset > file_stat.st_size:
+            return False
+
+        if offset == 0:
+            return True
+
+        if self._get_meta("inode") != file_stat.st_ino:
+            return False
+
+        head_size = min(offset, FINGERPRINT_SIZE)
+
+        return self._get_meta("head") == _head_hash(f, head_size)
+
+    def _iter_new_hashes(self, f):
+        for line in f:
+            note_hash = line.decode("utf-8").strip()
+            if note_hash:
+                self._bloom.add(note_hash)
+                yield (note_hash,)
+
+    def _rebuild_bloom(self, capacity):
+        self._bloom = BloomFilter(capacity)
+        self._is_bloom_changed = True
+
+        for (note_hash,) in self._db.execute("SELECT h FROM done"):
+            self._bloom.add(note_hash)
+
+    def _load_bloom(self):
+        row = self._db.execute("SELECT capacity, bits FROM bloom").fetchone()
+        if row is None:
+            return None
+
+        # Index was synced after the filter was saved, will be rebuilt on sync
+        if self._get_meta("bloom_offset") != self._get_meta("offset"):
+            return None
+
+        bloom = BloomFilter(row[0], row[1])
+
+        # Stored with different parameters, will be rebuilt on sync
+        if len(row[1]) * 8 != bloom.size:
+            return None
+
+        return bloom
+
+    def _get_meta(self, key):
+        row = self._db.execute("SELECT v FROM meta WHERE k=?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+
+def _head_hash(f, size):
+    f.seek(0)
+
+    # Fits into signed SQLite integer
+    return int.from_bytes(hashlib.sha1(f.read(size)).digest()[:7], "big")
+
+
+class BloomFilter(object):
+    """Probabilistic set without false negatives
+
+    With 16 bits per item and 3 hash functions false positive rate
+    stays around 0.5% until capacity is reached.
+    """
+
+    bits_per_item = 16
+
+    def __init__(self, capacity: int, bits: Optional[bytes] = None):
+        capacity = max(capacity, 1024)
+
+        self.size = 1 << (capacity * self.bits_per_item - 1).bit_length()
+        self._mask = self.size - 1
+
+        # Rounding size up to power of two leaves room for more items
+        self.capacity = self.size // self.bits_per_item
+
+        self._bits = bytearray(bits) if bits else bytearray(self.size // 8)
+
+    def __contains__(self, item):
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def as_buffer(self):
+        """Bits without a copy, for writing to the database"""
+
+        return memoryview(self._bits)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=12).digest()
+
+        return (
+            int.from_bytes(digest[i : i + 4], "little") & self._mask for i in (0, 4, 8)
+        )
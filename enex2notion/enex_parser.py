@@ -7,6 +7,7 @@ import uuid
 from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
+from typing import Callable, Optional
 from xml.etree import ElementTree
 
 from dateutil.parser import isoparse
@@ -16,7 +17,55 @@ from enex2notion.enex_types import EvernoteNote, EvernoteResource
 logger = logging.getLogger(__name__)
 
 
-def iter_notes(enex_file: Path):
+class NoteCursor(object):
+    """Note with resources left undecoded until materialize() is called"""
+
+    def __init__(self, note: EvernoteNote, resource_elems):
+        self._note = note
+        self._resource_elems = resource_elems
+
+    @property
+    def note_hash(self):
+        return self._note.note_hash
+
+    @property
+    def title(self):
+        return self._note.title
+
+    @property
+    def tags(self):
+        return self._note.tags
+
+    def materialize(self) -> EvernoteNote:
+        if self._resource_elems:
+            self._note.resources = [
+                _convert_resource(_etree_to_dict(r)["resource"])
+                for r in self._resource_elems
+            ]
+            self._resource_elems = []
+
+        return self._note
+
+
+def iter_notes(
+    enex_file: Path, skip_predicate: Optional[Callable[[str, str], bool]] = None
+):
+    """Iterate over notes in ENEX file
+
+    skip_predicate is called with note hash and title before note resources
+    are decoded, notes for which it returns True are not yielded.
+    """
+
+    for cursor in iter_note_cursors(enex_file):
+        if skip_predicate is not None and skip_predicate(
+            cursor.note_hash, cursor.title
+        ):
+            continue
+
+        yield cursor.materialize()
+
+
+def iter_note_cursors(enex_file: Path):
     with open(enex_file, "rb") as f:
         context = ElementTree.iterparse(f, events=("start", "end"))
 
@@ -24,11 +73,20 @@ def iter_notes(enex_file: Path):
 
         for event, elem in context:
             if event == "end" and elem.tag == "note":
-                yield _process_note(_etree_to_dict(elem)["note"])
+                yield _process_note_elem(elem)
 
             root.clear()
 
 
+def _process_note_elem(elem):
+    # Resources are the heaviest part, decode them only if note is needed
+    resource_elems = elem.findall("resource")
+    for resource in resource_elems:
+        elem.remove(resource)
+
+    return NoteCursor(_process_note(_etree_to_dict(elem)["note"]), resource_elems)
+
+
 # https://stackoverflow.com/a/10077069/13100286
 def _etree_to_dict(t):  # noqa: WPS210, WPS231, C901
     d = {t.tag: {} if t.attrib else None}
@@ -81,19 +139,10 @@ def _process_note(note_raw: dict):
         author=note_attrs.get("author", ""),
         url=note_attrs.get("source-url", ""),
         is_webclip=_is_webclip(note_raw),
-        resources=_parse_resources(note_raw),
+        resources=[],
     )
 
 
-def _parse_resources(note_raw):
-    note_resources = note_raw.get("resource", [])
-
-    if isinstance(note_resources, dict):
-        note_resources = [note_resources]
-
-    return [_convert_resource(r) for r in note_resources]
-
-
 def _is_webclip(note_raw: dict):
     note_attrs = note_raw.get("note-attributes") or {}
 
@@ -1,7 +1,7 @@
 import hashlib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
+from typing import List, Set
 
 
 @dataclass(frozen=True)
@@ -25,6 +25,10 @@ class EvernoteNote(object):
     is_webclip: bool
     resources: List[EvernoteResource]
     _note_hash: str = None
+    tags_set: Set[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.tags_set = set(self.tags)
 
     def resource_by_md5(self, md5):
         for resource in self.resources:
@@ -1,4 +1,7 @@
 import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 from notion.block import CollectionViewPageBlock, PageBlock
 from notion.client import NotionClient
@@ -6,29 +9,58 @@ from notion.collection import CollectionRowBlock
 from notion.operations import build_operation
 from progress.bar import Bar
 from requests import HTTPError, codes
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
 
 from enex2notion.enex_types import EvernoteNote
-from enex2notion.note_uploader import upload_block
+from enex2notion.note_uploader import upload_block, upload_files
 
 logger = logging.getLogger(__name__)
 
+# Shared by all clients, each of them caches its own copy of the schema
+_tag_options_lock = threading.Lock()
+
 
 class NoteUploadFailException(Exception):
     """Exception for when a note fails to upload"""
 
+    def __init__(self, *args, retry_after=None):
+        super().__init__(*args)
+
+        self.retry_after = retry_after
+
 
 class BadTokenException(Exception):
     """Exception for when a token is invalid"""
 
 
-def get_notion_client(token):
+def get_notion_client(token, pool_size=DEFAULT_POOLSIZE):
     try:
-        return NotionClient(token_v2=token)
+        client = NotionClient(token_v2=token)
     except HTTPError as e:  # pragma: no cover
         if e.response.status_code == codes["unauthorized"]:
             raise BadTokenException
         raise
 
+    _resize_pool(client.session, pool_size)
+
+    return client
+
+
+def _resize_pool(session, pool_size):
+    """Keep connections alive for every upload thread, reusing notion-py retries"""
+
+    if pool_size <= DEFAULT_POOLSIZE:
+        return
+
+    retries = session.get_adapter("https://").max_retries
+
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+        ),
+    )
+
 
 def get_import_root(client, title):
     try:
@@ -46,7 +78,9 @@ def get_import_root(client, title):
     return client.current_space.add_page(title)
 
 
-def upload_note(root, note: EvernoteNote, note_blocks):
+def upload_note(
+    root, note: EvernoteNote, note_blocks, upload_concurrency=1, show_progress=True
+):
     logger.info(f"Creating new page for note '{note.title}'")
     new_page = _make_page(note, root)
 
@@ -54,14 +88,21 @@ def upload_note(root, note: EvernoteNote, note_blocks):
     note_title = note.title.replace("%", "%%")
 
     try:
-        for block in Bar(f"Uploading '{note_title}'").iter(note_blocks):
-            upload_block(new_page, block)
-    except HTTPError:
+        file_uploads = upload_files(
+            new_page._client, note_blocks, upload_concurrency  # noqa: WPS437
+        )
+
+        if show_progress:
+            note_blocks = Bar(f"Uploading '{note_title}'").iter(note_blocks)
+
+        for block in note_blocks:
+            upload_block(new_page, block, file_uploads)
+    except HTTPError as e:
         if isinstance(new_page, CollectionRowBlock):
             new_page.remove()
         else:
             new_page.remove(permanently=True)
-        raise NoteUploadFailException
+        raise NoteUploadFailException(retry_after=_get_retry_after(e.response))
 
     # Set proper name after everything is uploaded
     new_page.title = note.title
@@ -69,6 +110,27 @@ def upload_note(root, note: EvernoteNote, note_blocks):
     _update_edit_time(new_page, note.updated)
 
 
+def _get_retry_after(response):
+    if response is None:
+        return None
+
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
 def _update_edit_time(page, date):
     page._client.submit_transaction(  # noqa: WPS437
         build_operation(
@@ -84,13 +146,40 @@ def _update_edit_time(page, date):
 def _make_page(note, root):
     tmp_name = f"{note.title} [UNFINISHED UPLOAD]"
 
-    return (
-        root.collection.add_row(
-            title=tmp_name,
-            url=note.url,
-            tags=note.tags,
-            created=note.created,
-        )
-        if isinstance(root, CollectionViewPageBlock)
-        else root.children.add_new(PageBlock, title=tmp_name)
+    if not isinstance(root, CollectionViewPageBlock):
+        return root.children.add_new(PageBlock, title=tmp_name)
+
+    _add_tag_options(root.collection, note.tags)
+
+    return root.collection.add_row(
+        title=tmp_name,
+        url=note.url,
+        tags=note.tags,
+        created=note.created,
     )
+
+
+def _add_tag_options(collection, tags):
+    """Add new tags to the schema before add_row does it
+
+    add_row writes the whole options list from the cached schema,
+    which would drop options added by uploads running on other clients.
+    """
+
+    if _has_tag_options(collection, tags):
+        return
+
+    with _tag_options_lock:
+        collection.refresh()
+
+        prop = collection.get_schema_property("tags")
+        is_updated, prop = collection.check_schema_select_options(prop, tags)
+        if is_updated:
+            collection.set(f"schema.{prop['id']}.options", prop["options"])
+
+
+def _has_tag_options(collection, tags):
+    prop = collection.get_schema_property("tags")
+    options = {o["value"].lower() for o in prop.get("options", [])}
+
+    return all(tag.lower() in options for tag in tags if tag)
@@ -1,8 +1,34 @@
+import functools
+
 from notion.block import CollectionViewPageBlock, PageBlock
 
 from enex2notion.rand_id import rand_id_list
 
 
+def _cache_by_root(func):
+    """Remember found or created notebooks to avoid walking root children again
+
+    Use cache_clear() if notebooks were changed outside of this module
+    """
+
+    cache = {}
+
+    @functools.wraps(func)
+    def wrapper(root, title):
+        key = (root.id, title)
+
+        # Failed lookups raise before anything is cached
+        if key not in cache:
+            cache[key] = func(root, title)
+
+        return cache[key]
+
+    wrapper.cache_clear = cache.clear
+
+    return wrapper
+
+
+@_cache_by_root
 def get_notebook_page(root, title):
     existing = _get_existing_notebook_page(root, title)
     if existing is not None:
@@ -19,6 +45,7 @@ def _get_existing_notebook_page(root, title):
     return next(child_match, None)
 
 
+@_cache_by_root
 def get_notebook_database(root, title):
     _cleanup_empty_databases(root)
 
@@ -31,16 +31,28 @@ def extract_nested_blocks(root: Tag):
 
         # tables, pictures (or files), encrypted blocks
         if child.name in {"ol", "ul"}:
-            subblocks = child.find_all(["table", "en-crypt"])
+            subblocks = find_all_tags(child, {"table", "en-crypt"})
         else:
-            subblocks = child.find_all(["img", "en-media", "table", "en-crypt"])
+            subblocks = find_all_tags(child, {"img", "en-media", "table", "en-crypt"})
 
         # special evernote blocks
-        subblocks += filter(_is_div_special_block, child.find_all("div"))
+        subblocks += filter(_is_div_special_block, find_all_tags(child, {"div"}))
 
         child.insert_after(*subblocks)
 
 
+def find_all_tags(element: Tag, names):
+    """Same as element.find_all(names) for a set of tag names
+
+    Plain traversal is a lot faster than building BeautifulSoup filter
+    on every call, which matters on notes with thousands of elements
+    """
+
+    return [
+        tag for tag in element.descendants if isinstance(tag, Tag) and tag.name in names
+    ]
+
+
 def flatten_root(root: Tag):
     """Make sure that each <div> block represents single paragraph
     BAD                     | GOOD
@@ -108,7 +120,10 @@ def _make_block(elements: List[Tag]):
 
 
 def _is_element_has_direct_blocks(element):
-    return bool(element.find(BLOCK_TAGS, recursive=False))
+    return any(
+        isinstance(child, Tag) and child.name in BLOCK_TAGS
+        for child in element.children
+    )
 
 
 def _is_div_special_block(element: Tag):
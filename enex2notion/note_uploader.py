@@ -1,25 +1,101 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
 from notion.block import FileBlock
 from notion.settings import S3_URL_PREFIX
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from enex2notion.enex_types import EvernoteResource
 from enex2notion.notion_blocks_uploadable import NotionUploadableBlock
 
+S3_POOL_SIZE = 32
+
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+
+def _create_s3_session():
+    """Shared by all upload threads to reuse connections to S3
+
+    Separate from the Notion session, which carries the auth cookie
+    """
+
+    session = Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=S3_POOL_SIZE,
+            pool_maxsize=S3_POOL_SIZE,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 502, 503, 504),
+                # Return last response so raise_for_status() raises HTTPError
+                raise_on_status=False,
+            ),
+        ),
+    )
+    return session
+
+
+_s3_session = _create_s3_session()
 
-def upload_block(root, block):
-    new_block = root.children.add_new(block.type, **block.attrs)
 
-    for p_key, p_value in block.properties.items():
-        new_block.set(p_key, p_value)
+def upload_block(root, block, file_uploads=None):
+    new_block = root.children.add_new(block.type)
 
-    if isinstance(block, NotionUploadableBlock):
-        _upload_file(new_block, block.resource)
+    # Send all block fields in a single request
+    with new_block._client.as_atomic_transaction():  # noqa: WPS437
+        for a_key, a_value in block.attrs.items():
+            setattr(new_block, a_key, a_value)
+
+        for p_key, p_value in block.properties.items():
+            new_block.set(p_key, p_value)
+
+        if isinstance(block, NotionUploadableBlock):
+            upload_data = None
+            if file_uploads is not None:
+                upload_data = file_uploads.get(id(block))
+            _upload_file(new_block, block.resource, upload_data)
 
     for sub_block in block.children:
-        upload_block(new_block, sub_block)
+        upload_block(new_block, sub_block, file_uploads)
+
+
+def upload_files(client, blocks, concurrency):
+    """Upload all files from blocks in parallel before creating the blocks
+
+    Blocks are appended one by one to keep their order,
+    but files don't depend on them and can be uploaded at the same time.
+    """
+
+    uploadable = [
+        b for b in _iter_blocks(blocks) if isinstance(b, NotionUploadableBlock)
+    ]
+    if not uploadable:
+        return {}
+
+    with ThreadPoolExecutor(min(concurrency, len(uploadable))) as executor:
+        futures = {
+            id(block): executor.submit(_upload_resource, client, block.resource)
+            for block in uploadable
+        }
+
+        try:
+            return {block_id: f.result() for block_id, f in futures.items()}
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+
 
+def _iter_blocks(blocks):
+    for block in blocks:
+        yield block
+        yield from _iter_blocks(block.children)
 
-def _upload_file(new_block, resource: EvernoteResource):
+
+def _upload_file(new_block, resource: EvernoteResource, upload_data=None):
     """Copy/paste from EmbedOrUploadBlock class
 
     changes:
@@ -27,25 +103,32 @@ def _upload_file(new_block, resource: EvernoteResource):
         set size and title for FileBlock
     """
 
-    upload_data = new_block._client.post(  # noqa: WPS437
+    if upload_data is None:
+        upload_data = _upload_resource(new_block._client, resource)  # noqa: WPS437
+
+    new_block.display_source = upload_data["url"]
+    new_block.source = upload_data["url"]
+    new_block.file_id = _extract_file_id(upload_data["url"])
+
+    if isinstance(new_block, FileBlock):
+        new_block.size = _sizeof_fmt(len(resource.data_bin))
+        new_block.title = resource.file_name
+
+
+def _upload_resource(client, resource: EvernoteResource):
+    upload_data = client.post(
         "getUploadFileUrl",
         {"bucket": "secure", "name": resource.file_name, "contentType": resource.mime},
     ).json()
 
-    response = requests.put(
+    response = _s3_session.put(
         upload_data["signedPutUrl"],
         data=resource.data_bin,
         headers={"Content-type": resource.mime},
     )
     response.raise_for_status()
 
-    new_block.display_source = upload_data["url"]
-    new_block.source = upload_data["url"]
-    new_block.file_id = _extract_file_id(upload_data["url"])
-
-    if isinstance(new_block, FileBlock):
-        new_block.size = _sizeof_fmt(len(resource.data_bin))
-        new_block.title = resource.file_name
+    return upload_data
 
 
 def _extract_file_id(url):
@@ -53,10 +136,10 @@ def _extract_file_id(url):
 
 
 def _sizeof_fmt(num):
-    for unit in ("B", "KB", "MB", "GB"):
-        if abs(num) < 1024:
-            if unit == "B":
-                return f"{num}{unit}"
-            return f"{num:3.1f}{unit}"
-        num /= 1024.0
-    return f"{num:.1f}TB"
+    if num < 1024:
+        return f"{num}B"
+
+    # Each unit is 2^10 times larger, TB for everything above
+    unit_idx = min((num.bit_length() - 1) // 10, len(SIZE_UNITS) - 1)
+
+    return f"{num / (1 << unit_idx * 10):3.1f}{SIZE_UNITS[unit_idx]}"
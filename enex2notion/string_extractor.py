@@ -3,6 +3,7 @@ from typing import List
 
 from bs4 import NavigableString, Tag
 
+from enex2notion.note_parser_helpers import find_all_tags
 from enex2notion.notion_blocks_text import TextProp
 from enex2notion.string_extractor_properties import resolve_string_properties
 
@@ -19,7 +20,7 @@ def extract_string(tag: Tag) -> TextProp:
 
     # Element is either a single div itself or a collection of div or h1-3 "lines"
     # it can also contain random inline strings, so we group them in separate lines
-    div_lines = _split_line(copy.copy(tag)) if tag.find_all(STANDALONES) else [tag]
+    div_lines = _split_line(copy.copy(tag)) if _has_standalones(tag) else [tag]
 
     string_blocks = _extract_blocks(div_lines)
 
@@ -28,6 +29,12 @@ def extract_string(tag: Tag) -> TextProp:
     return TextProp(result_string, result_properties)
 
 
+def _has_standalones(tag: Tag):
+    return any(
+        isinstance(sub, Tag) and sub.name in STANDALONES for sub in tag.descendants
+    )
+
+
 def _split_line(element: Tag):
     blocks = []
     group = []
@@ -93,7 +100,7 @@ def _extract_blocks(div_lines):
 
 
 def _convert_newlines(element: Tag):
-    for br in element.find_all("br"):
+    for br in find_all_tags(element, {"br"}):
         br.replace_with("\n")
 
 
@@ -4,8 +4,10 @@ import json
 import os
 import platform
 import uuid
+from copy import deepcopy
 from hashlib import md5
 from pathlib import Path
+from unittest.mock import MagicMock
 
 import pytest
 from bs4 import BeautifulSoup
@@ -13,6 +15,71 @@ from notion.block import PageBlock
 from notion.client import NotionClient
 
 from enex2notion.enex_types import EvernoteResource
+from enex2notion.enex_uploader_modes import get_notebook_database, get_notebook_page
+
+
+class FakeNotionClient(NotionClient):
+    """Offline client with notion-py transactions, records submitted operations
+
+    Clients created with the same records dict act as if connected
+    to the same workspace, each keeping its own cached copy of records.
+    """
+
+    def __init__(self, records=None):  # noqa: WPS612
+        self._monitor = None
+        self._store = MagicMock()
+
+        self.transactions = []
+
+        self.records = records
+        self._cache = {}
+
+    def submit_transaction(self, operations, update_last_edited=True):
+        if isinstance(operations, dict):
+            operations = [operations]
+
+        if self.in_transaction():
+            self._transaction_operations += operations
+            return
+
+        self.transactions.append(operations)
+
+        if self.records is not None:
+            for op in operations:
+                record = self.records.setdefault((op["table"], op["id"]), {})
+                _set_by_path(record, op["path"], deepcopy(op["args"]))
+                self._cache[op["table"], op["id"]] = deepcopy(record)
+
+    def get_record_data(self, table, id, force_refresh=False, limit=100):
+        if self.records is None:
+            return super().get_record_data(table, id, force_refresh, limit)
+
+        if force_refresh or (table, id) not in self._cache:
+            self._cache[table, id] = deepcopy(self.records.get((table, id), {}))
+
+        return self._cache[table, id]
+
+    def get_block(self, url_or_id, force_refresh=False, limit=100):
+        if self.records is None:
+            return PageBlock(self, url_or_id)
+
+        return super().get_block(url_or_id, force_refresh, limit)
+
+
+def _set_by_path(record, path, value):
+    if not path:
+        record.update(value)
+        return
+
+    for key in path[:-1]:
+        record = record.setdefault(key, {})
+
+    record[path[-1]] = value
+
+
+@pytest.fixture()
+def fake_notion_client():
+    return FakeNotionClient
 
 
 @pytest.fixture(scope="module")
@@ -123,6 +190,9 @@ def notion_test_page(vcr_cassette_dir, vcr_cassette_name):
 
     page.remove(permanently=True)
 
+    get_notebook_database.cache_clear()
+    get_notebook_page.cache_clear()
+
 
 @pytest.fixture()
 def smallest_gif():
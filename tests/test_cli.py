@@ -1,21 +1,45 @@
 import logging
+import threading
+from datetime import datetime
+from pathlib import Path
 
 import pytest
+from dateutil.tz import tzutc
 from requests import HTTPError
 
-from enex2notion.cli import cli
+from enex2notion.cli import EnexUploader, cli
+from enex2notion.done_file import SqliteHashSet
+from enex2notion.enex_types import EvernoteNote
 from enex2notion.enex_uploader import BadTokenException, NoteUploadFailException
 
 
 @pytest.fixture()
 def mock_api(mocker):
+    sleep = mocker.MagicMock()
+
+    class InstantEvent(threading.Event):
+        """Retry delays are passed to sleep mock instead of waiting"""
+
+        def wait(self, timeout=None):
+            sleep(timeout)
+            return self.is_set()
+
+    mocker.patch("enex2notion.cli.threading", Event=InstantEvent, Lock=threading.Lock)
+
     return {
-        "get_import_root": mocker.patch("enex2notion.cli.get_import_root"),
-        "get_notion_client": mocker.patch("enex2notion.cli.get_notion_client"),
-        "get_notebook_database": mocker.patch("enex2notion.cli.get_notebook_database"),
-        "get_notebook_page": mocker.patch("enex2notion.cli.get_notebook_page"),
-        "upload_note": mocker.patch("enex2notion.cli.upload_note"),
-        "parse_note": mocker.patch("enex2notion.cli.parse_note"),
+        "get_import_root": mocker.patch("enex2notion.enex_uploader.get_import_root"),
+        "get_notion_client": mocker.patch(
+            "enex2notion.enex_uploader.get_notion_client"
+        ),
+        "get_notebook_database": mocker.patch(
+            "enex2notion.enex_uploader_modes.get_notebook_database"
+        ),
+        "get_notebook_page": mocker.patch(
+            "enex2notion.enex_uploader_modes.get_notebook_page"
+        ),
+        "upload_note": mocker.patch("enex2notion.enex_uploader.upload_note"),
+        "parse_note": mocker.patch("enex2notion.note_parser.parse_note"),
+        "sleep": sleep,
     }
 
 
@@ -24,6 +48,15 @@ def fake_note_factory(mocker):
     mock_iter = mocker.patch("enex2notion.cli.iter_notes")
     mock_iter.return_value = [mocker.MagicMock(note_hash="fake_hash", is_webclip=False)]
 
+    def fake_iter_notes(*args, skip_predicate=None):
+        return [
+            note
+            for note in mock_iter.return_value
+            if skip_predicate is None or not skip_predicate(note.note_hash, note.title)
+        ]
+
+    mock_iter.side_effect = fake_iter_notes
+
     return mock_iter
 
 
@@ -42,6 +75,111 @@ def test_dir(mock_api, fake_note_factory, fs):
     mock_api["parse_note"].assert_called_once()
 
 
+def test_dir_file_workers(mock_api, fake_note_factory, mocker, fs):
+    fs.makedir("test_dir")
+    for i in range(5):
+        fs.create_file(f"test_dir/test{i}.enex")
+
+    fake_note_factory.side_effect = lambda enex_file, skip_predicate: [
+        mocker.MagicMock(note_hash=enex_file.stem, is_webclip=False)
+    ]
+
+    cli(["--token", "fake_token", "--file-workers", "3", "test_dir"])
+
+    assert mock_api["upload_note"].call_count == 5
+
+
+def test_dir_done_file_index_saved_once(mock_api, fake_note_factory, mocker, tmp_path):
+    mocker.patch("enex2notion.done_file.SQLITE_THRESHOLD", 0)
+    save = mocker.spy(SqliteHashSet, "save_bloom")
+
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash\n")
+
+    enex_dir = tmp_path / "test_dir"
+    enex_dir.mkdir()
+    for i in range(3):
+        (enex_dir / f"test{i}.enex").touch()
+
+    fake_note_factory.side_effect = lambda enex_file, skip_predicate: [
+        mocker.MagicMock(note_hash=enex_file.stem, is_webclip=False)
+    ]
+
+    cli(["--token", "fake_token", "--done-file", str(done_path), str(enex_dir)])
+
+    assert save.call_count == 1
+    assert done_path.read_text() == "fake_hash\ntest0\ntest1\ntest2\n"
+
+
+def test_dir_file_workers_fail(mock_api, fake_note_factory, mocker, fs):
+    fs.makedir("test_dir")
+    for i in range(5):
+        fs.create_file(f"test_dir/test{i}.enex")
+
+    mock_api["upload_note"].side_effect = NoteUploadFailException
+
+    with pytest.raises(NoteUploadFailException):
+        cli(["--token", "fake_token", "--file-workers", "3", "test_dir"])
+
+
+def test_dir_file_workers_fail_fast(mock_api, fake_note_factory, mocker, fs):
+    fs.makedir("test_dir")
+    for i in range(5):
+        fs.create_file(f"test_dir/test{i}.enex")
+
+    fake_note_factory.side_effect = lambda enex_file, skip_predicate: [
+        mocker.MagicMock(note_hash=f"{enex_file.stem}_{i}", is_webclip=False)
+        for i in range(20 if enex_file.stem == "test1" else 1)
+    ]
+
+    uploaded = []
+
+    def fake_upload_note(root, note, note_blocks, **kwargs):
+        if note.note_hash == "test0_0":
+            raise NoteUploadFailException
+
+        threading.Event().wait(0.01)
+        uploaded.append(note.note_hash)
+
+    mock_api["upload_note"].side_effect = fake_upload_note
+
+    with pytest.raises(NoteUploadFailException):
+        cli(["--token", "fake_token", "--file-workers", "2", "test_dir"])
+
+    assert len(uploaded) < 20
+    assert all(h.startswith("test1_") for h in uploaded)
+
+
+def test_dir_order(mock_api, fake_note_factory, mocker, fs):
+    fs.create_file("test_dir/b.enex")
+    fs.create_file("test_dir/a/c.enex")
+    fs.create_file("test_dir/a/b/a.enex")
+    fs.create_file("test_dir/a.enex")
+    fs.create_file("test_dir/a.txt")
+    fs.makedir("test_dir/d.enex")
+
+    cli(["test_dir"])
+
+    assert [c.args[0] for c in fake_note_factory.call_args_list] == [
+        Path("test_dir/a/b/a.enex"),
+        Path("test_dir/a/c.enex"),
+        Path("test_dir/a.enex"),
+        Path("test_dir/b.enex"),
+    ]
+
+
+def test_dir_uppercase_ext(mock_api, fake_note_factory, mocker, fs):
+    fs.create_file("test_dir/a.ENEX")
+    fs.create_file("test_dir/b.Enex")
+
+    cli(["test_dir"])
+
+    assert [c.args[0] for c in fake_note_factory.call_args_list] == [
+        Path("test_dir/a.ENEX"),
+        Path("test_dir/b.Enex"),
+    ]
+
+
 def test_empty_dir(mock_api, fake_note_factory, fs):
     fs.makedir("test_dir")
 
@@ -79,6 +217,112 @@ def test_db_mode(mock_api, fake_note_factory, mocker):
     mock_api["get_notebook_database"].assert_called_once_with(mocker.ANY, "fake")
 
 
+def test_connection_pool_size(mock_api, fake_note_factory, mocker):
+    cli(
+        [
+            "--token",
+            "fake_token",
+            "--workers",
+            "4",
+            "--file-workers",
+            "3",
+            "--upload-concurrency",
+            "2",
+            "fake.enex",
+        ]
+    )
+
+    assert mock_api["get_notion_client"].call_args_list[0] == mocker.call("fake_token")
+    assert all(
+        c == mocker.call("fake_token", pool_size=2)
+        for c in mock_api["get_notion_client"].call_args_list[1:]
+    )
+
+
+def test_workers_separate_transactions(
+    mock_api, fake_note_factory, fake_notion_client, mocker
+):
+    main_client = fake_notion_client()
+    clients = [main_client]
+
+    def new_client(token, pool_size=None):
+        if pool_size is None:
+            return main_client
+        clients.append(fake_notion_client())
+        return clients[-1]
+
+    mock_api["get_notion_client"].side_effect = new_client
+    mock_api["get_notebook_database"].return_value = main_client.get_block(
+        "a1b2c3d4-0000-0000-0000-000000000000"
+    )
+
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False) for i in range(8)
+    ]
+
+    def fake_upload_note(root, note, note_blocks, **kwargs):
+        client = root._client
+        with client.as_atomic_transaction():
+            for _ in range(5):
+                client.submit_transaction({"note": note.note_hash})
+                threading.Event().wait(0.001)
+
+    mock_api["upload_note"].side_effect = fake_upload_note
+
+    cli(["--token", "fake_token", "--workers", "4", "fake.enex"])
+
+    transactions = [t for client in clients for t in client.transactions]
+
+    assert not main_client.transactions
+    assert sorted(t[0]["note"] for t in transactions) == sorted(
+        f"fake_hash{i}" for i in range(8)
+    )
+    assert all(t == [t[0]] * 5 for t in transactions)
+
+
+def test_upload_concurrency(mock_api, fake_note_factory, mocker):
+    cli(["--token", "fake_token", "--upload-concurrency", "3", "fake.enex"])
+
+    mock_api["upload_note"].assert_called_once_with(
+        mocker.ANY, mocker.ANY, mocker.ANY, upload_concurrency=3, show_progress=True
+    )
+
+
+@pytest.mark.parametrize(
+    "args",
+    [["--workers", "2"], ["--file-workers", "2"]],
+)
+def test_workers_no_progress(args, mock_api, fake_note_factory, mocker):
+    cli(["--token", "fake_token", *args, "fake.enex"])
+
+    mock_api["upload_note"].assert_called_once_with(
+        mocker.ANY, mocker.ANY, mocker.ANY, upload_concurrency=8, show_progress=False
+    )
+
+
+def test_uploader_default_clients(mock_api, fake_note_factory, mocker):
+    root = mocker.MagicMock()
+    root._client.session.cookies = {"token_v2": "fake_token"}
+
+    enex_uploader = EnexUploader(
+        import_root=root,
+        mode="DB",
+        mode_webclips="TXT",
+        done_file=None,
+        add_meta=False,
+        add_pdf_preview=False,
+        condense_lines=False,
+        condense_lines_sparse=False,
+        custom_tag=None,
+        workers=2,
+    )
+
+    enex_uploader.upload(Path("fake.enex"))
+
+    mock_api["get_notion_client"].assert_called_once_with("fake_token", pool_size=1)
+    mock_api["upload_note"].assert_called_once()
+
+
 def test_page_mode(mock_api, fake_note_factory, mocker):
     cli(["--token", "fake_token", "--mode", "PAGE", "fake.enex"])
 
@@ -96,6 +340,72 @@ def test_upload_fail_retry(mock_api, fake_note_factory, mocker, caplog):
     assert "Failed to upload note" in caplog.text
 
 
+def test_upload_fail_retry_backoff(mock_api, fake_note_factory, mocker):
+    mock_api["upload_note"].side_effect = [NoteUploadFailException] * 4 + [None]
+    mocker.patch("enex2notion.cli.random.uniform", return_value=1)
+
+    cli(["--token", "fake_token", "--retry-base", "1", "--retry-cap", "5", "fake.enex"])
+
+    assert mock_api["sleep"].call_args_list == [
+        mocker.call(1),
+        mocker.call(2),
+        mocker.call(4),
+        mocker.call(5),
+    ]
+
+
+def test_upload_fail_retry_after(mock_api, fake_note_factory, mocker):
+    mock_api["upload_note"].side_effect = [
+        NoteUploadFailException(retry_after=10),
+        None,
+    ]
+
+    cli(["--token", "fake_token", "fake.enex"])
+
+    mock_api["sleep"].assert_called_once_with(10)
+
+
+def test_upload_fail_retry_after_capped(mock_api, fake_note_factory, caplog):
+    mock_api["upload_note"].side_effect = [
+        NoteUploadFailException(retry_after=100),
+        None,
+    ]
+
+    with caplog.at_level(logging.INFO, logger="enex2notion"):
+        cli(["--token", "fake_token", "--retry-cap", "5", "fake.enex"])
+
+    mock_api["sleep"].assert_called_once_with(5)
+    assert "Notion asked to wait 100.0s before retry" in caplog.text
+
+
+def test_interrupt_during_retry(mock_api, fake_note_factory, mocker):
+    mocker.patch("enex2notion.cli.threading", threading)
+
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False) for i in range(2)
+    ]
+
+    upload_started = threading.Event()
+
+    def fake_upload_note(root, note, note_blocks, **kwargs):
+        upload_started.set()
+        raise NoteUploadFailException(retry_after=1000)
+
+    def fake_parse_note(note, **kwargs):
+        if note.note_hash == "fake_hash1":
+            upload_started.wait()
+            raise KeyboardInterrupt
+        return ["fake_block"]
+
+    mock_api["upload_note"].side_effect = fake_upload_note
+    mock_api["parse_note"].side_effect = fake_parse_note
+
+    with pytest.raises(KeyboardInterrupt):
+        cli(["--token", "fake_token", "--workers", "2", "fake.enex"])
+
+    assert mock_api["upload_note"].call_count == 1
+
+
 def test_upload_fail(mock_api, fake_note_factory, mocker, caplog):
     mock_api["upload_note"].side_effect = [NoteUploadFailException] * 5
 
@@ -103,6 +413,187 @@ def test_upload_fail(mock_api, fake_note_factory, mocker, caplog):
         cli(["--token", "fake_token", "fake.enex"])
 
 
+def test_workers(mock_api, fake_note_factory, mocker, fs):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False) for i in range(10)
+    ]
+
+    cli(
+        [
+            "--token",
+            "fake_token",
+            "--workers",
+            "4",
+            "--done-file",
+            "done.txt",
+            "fake.enex",
+        ]
+    )
+
+    with open("done.txt") as f:
+        done_result = f.read()
+
+    assert mock_api["upload_note"].call_count == 10
+    assert sorted(done_result.split()) == sorted(f"fake_hash{i}" for i in range(10))
+
+
+def test_parse_while_uploading(mock_api, fake_note_factory, mocker):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash="fake_hash1", is_webclip=False),
+        mocker.MagicMock(note_hash="fake_hash2", is_webclip=False),
+    ]
+
+    second_parsed = threading.Event()
+    parsed_during_upload = []
+
+    def fake_parse_note(note, **kwargs):
+        if note.note_hash == "fake_hash2":
+            second_parsed.set()
+        return ["fake_block"]
+
+    def fake_upload_note(root, note, note_blocks, **kwargs):
+        if note.note_hash == "fake_hash1":
+            parsed_during_upload.append(second_parsed.wait(5))
+
+    mock_api["parse_note"].side_effect = fake_parse_note
+    mock_api["upload_note"].side_effect = fake_upload_note
+
+    cli(["--token", "fake_token", "fake.enex"])
+
+    assert parsed_during_upload == [True]
+
+
+def test_max_in_flight(mock_api, fake_note_factory, mocker):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False) for i in range(10)
+    ]
+
+    uploaded = []
+    queued_on_parse = []
+
+    def fake_parse_note(note, **kwargs):
+        queued_on_parse.append(len(queued_on_parse) - len(uploaded))
+        return ["fake_block"]
+
+    def fake_upload_note(root, note, note_blocks, **kwargs):
+        threading.Event().wait(0.02)
+        uploaded.append(note)
+
+    mock_api["parse_note"].side_effect = fake_parse_note
+    mock_api["upload_note"].side_effect = fake_upload_note
+
+    cli(["--token", "fake_token", "--max-in-flight", "3", "fake.enex"])
+
+    assert len(uploaded) == 10
+    assert max(queued_on_parse) == 3
+
+
+@pytest.mark.parametrize(
+    "arg",
+    [
+        "--workers",
+        "--max-in-flight",
+        "--file-workers",
+        "--upload-concurrency",
+        "--batch-size",
+    ],
+)
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_positive_int_args(arg, value, mock_api, fake_note_factory, capsys):
+    with pytest.raises(SystemExit):
+        cli([arg, value, "fake.enex"])
+
+    assert "must be positive" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("arg", ["--retry-base", "--retry-cap"])
+def test_negative_retry_args(arg, mock_api, fake_note_factory, capsys):
+    with pytest.raises(SystemExit):
+        cli([arg, "-1", "fake.enex"])
+
+    assert "must not be negative" in capsys.readouterr().err
+
+
+def test_zero_retry_args(mock_api, fake_note_factory):
+    cli(["--retry-base", "0", "--retry-cap", "0", "fake.enex"])
+
+    fake_note_factory.assert_called_once()
+
+
+def test_workers_fail(mock_api, fake_note_factory, mocker, fs):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False) for i in range(10)
+    ]
+
+    mock_api["upload_note"].side_effect = NoteUploadFailException
+
+    with pytest.raises(NoteUploadFailException):
+        cli(["--token", "fake_token", "--workers", "4", "fake.enex"])
+
+
+def test_workers_fail_keeps_finished(mock_api, fake_note_factory, mocker, fs):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False) for i in range(8)
+    ]
+
+    uploaded = []
+
+    def fake_upload_note(root, note, note_blocks, **kwargs):
+        if note.note_hash == "fake_hash0":
+            raise NoteUploadFailException
+
+        threading.Event().wait(0.05)
+        uploaded.append(note.note_hash)
+
+    mock_api["upload_note"].side_effect = fake_upload_note
+
+    with pytest.raises(NoteUploadFailException):
+        cli(
+            [
+                "--token",
+                "fake_token",
+                "--workers",
+                "2",
+                "--done-file",
+                "done.txt",
+                "fake.enex",
+            ]
+        )
+
+    with open("done.txt") as f:
+        done_hashes = f.read().splitlines()
+
+    assert uploaded
+    assert sorted(done_hashes) == sorted(uploaded)
+
+
+def test_interrupt_keeps_finished(mock_api, fake_note_factory, mocker, fs):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False) for i in range(3)
+    ]
+
+    upload_started = threading.Event()
+
+    def fake_upload_note(root, note, note_blocks, **kwargs):
+        upload_started.set()
+        threading.Event().wait(0.05)
+
+    def fake_parse_note(note, **kwargs):
+        if note.note_hash == "fake_hash1":
+            upload_started.wait(1)
+            raise KeyboardInterrupt
+        return ["block"]
+
+    mock_api["upload_note"].side_effect = fake_upload_note
+    mock_api["parse_note"].side_effect = fake_parse_note
+
+    with pytest.raises(KeyboardInterrupt):
+        cli(["--token", "fake_token", "--done-file", "done.txt", "fake.enex"])
+
+    with open("done.txt") as f:
+        assert f.read() == "fake_hash0\n"
+
+
 def test_add_meta(mock_api, fake_note_factory, mocker):
     cli(["--add-meta", "fake.enex"])
 
@@ -117,13 +608,37 @@ def test_add_meta(mock_api, fake_note_factory, mocker):
 
 
 def test_skip_dupe(mock_api, fake_note_factory, mocker):
-    cli(["--token", "fake_token", "fake.enex"])
-
     fake_note_factory.return_value = [
         mocker.MagicMock(note_hash="fake_hash"),
         mocker.MagicMock(note_hash="fake_hash"),
     ]
 
+    cli(["--token", "fake_token", "fake.enex"])
+
+    mock_api["upload_note"].assert_called_once()
+
+
+def test_skip_dupe_in_flight(mock_api, fake_note_factory, mocker, fs):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash="fake_hash", is_webclip=False),
+        mocker.MagicMock(note_hash="fake_hash", is_webclip=False),
+    ]
+
+    cli(
+        [
+            "--token",
+            "fake_token",
+            "--workers",
+            "2",
+            "--done-file",
+            "done.txt",
+            "fake.enex",
+        ]
+    )
+
+    with open("done.txt") as f:
+        assert f.read() == "fake_hash\n"
+
     mock_api["upload_note"].assert_called_once()
 
 
@@ -144,6 +659,30 @@ def test_done_file(mock_api, fake_note_factory, mocker, fs):
     assert done_result == "fake_hash1\nfake_hash2\n"
 
 
+def test_done_file_batched(mock_api, fake_note_factory, mocker, fs):
+    fake_note_factory.return_value = [
+        mocker.MagicMock(note_hash=f"fake_hash{i}", is_webclip=False)
+        for i in range(100)
+    ]
+
+    cli(
+        [
+            "--token",
+            "fake_token",
+            "--batch-size",
+            "16",
+            "--done-file",
+            "done.txt",
+            "fake.enex",
+        ]
+    )
+
+    with open("done.txt") as f:
+        done_result = f.read()
+
+    assert done_result == "".join(f"fake_hash{i}\n" for i in range(100))
+
+
 def test_done_file_populated(mock_api, fake_note_factory, mocker, fs):
     fs.create_file("done.txt", contents="fake_hash1\nfake_hash2\n")
 
@@ -195,7 +734,7 @@ def test_webclip_pdf(mock_api, fake_note_factory, mocker):
         mocker.MagicMock(note_hash="fake_hash1", is_webclip=True),
     ]
 
-    mocker.patch("enex2notion.cli.ensure_wkhtmltopdf")
+    mocker.patch("enex2notion.cli_wkhtmltopdf.ensure_wkhtmltopdf")
 
     cli(["--mode-webclips", "PDF", "fake.enex"])
 
@@ -214,7 +753,7 @@ def test_webclip_pdf_with_preview(mock_api, fake_note_factory, mocker):
         mocker.MagicMock(note_hash="fake_hash1", is_webclip=True),
     ]
 
-    mocker.patch("enex2notion.cli.ensure_wkhtmltopdf")
+    mocker.patch("enex2notion.cli_wkhtmltopdf.ensure_wkhtmltopdf")
 
     cli(["--mode-webclips", "PDF", "--add-pdf-preview", "fake.enex"])
 
@@ -267,5 +806,24 @@ def test_custom_tag(mock_api, fake_note_factory):
     fake_note_factory()[0].tags.append.assert_called_once_with("test_tag")
 
 
+def test_custom_tag_existing(mock_api, fake_note_factory):
+    note = EvernoteNote(
+        title="test1",
+        created=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
+        updated=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
+        content="",
+        tags=["tag1", "test_tag"],
+        author="",
+        url="",
+        is_webclip=False,
+        resources=[],
+    )
+    fake_note_factory.return_value = [note]
+
+    cli(["--tag", "test_tag", "fake.enex"])
+
+    assert note.tags == ["tag1", "test_tag"]
+
+
 def test_cli_main_import():
     from enex2notion import __main__
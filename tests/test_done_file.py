@@ -0,0 +1,244 @@
+from pathlib import Path
+
+import pytest
+
+from enex2notion.done_file import BloomFilter, DoneFile, SqliteHashSet
+
+
+@pytest.fixture()
+def large_done_file(mocker):
+    mocker.patch("enex2notion.done_file.SQLITE_THRESHOLD", 0)
+
+
+def test_add_unopened(fs):
+    done_file = DoneFile(Path("done.txt"))
+
+    done_file.add("fake_hash1")
+
+    with open("done.txt") as f:
+        done_result = f.read()
+
+    assert "fake_hash1" in done_file
+    assert done_result == "fake_hash1\n"
+
+
+def test_no_path():
+    done_file = DoneFile(None)
+
+    with done_file:
+        done_file.add("fake_hash1")
+
+    assert "fake_hash1" in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\nfake_hash2\n")
+
+    done_file = DoneFile(done_path)
+
+    assert isinstance(done_file.done_hashes, SqliteHashSet)
+    assert "fake_hash1" in done_file
+    assert "fake_hash2" in done_file
+    assert "fake_hash3" not in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_add(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    done_file = DoneFile(done_path, flush_every=1)
+
+    with done_file:
+        done_file.add("fake_hash2")
+
+    assert "fake_hash2" in done_file
+    assert done_path.read_text() == "fake_hash1\nfake_hash2\n"
+    assert "fake_hash2" in DoneFile(done_path)
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_sync_appended(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    DoneFile(done_path)
+
+    with open(done_path, "a") as f:
+        f.write("fake_hash2\n")
+
+    assert "fake_hash2" in DoneFile(done_path)
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_sync_truncated(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\nfake_hash2\n")
+
+    DoneFile(done_path)
+
+    done_path.write_text("fake_hash3\n")
+
+    done_file = DoneFile(done_path)
+
+    assert "fake_hash1" not in done_file
+    assert "fake_hash3" in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_sync_replaced(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\nfake_hash2\n")
+
+    DoneFile(done_path)
+
+    new_path = tmp_path / "new_done.txt"
+    new_path.write_text("fake_hash3\nfake_hash4\nfake_hash5\n")
+    new_path.replace(done_path)
+
+    done_file = DoneFile(done_path)
+
+    assert "fake_hash1" not in done_file
+    assert "fake_hash2" not in done_file
+    assert "fake_hash3" in done_file
+    assert "fake_hash4" in done_file
+    assert "fake_hash5" in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_sync_rewritten_in_place(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    DoneFile(done_path)
+
+    # Same inode, different content
+    done_path.write_text("fake_hash2\nfake_hash3\n")
+
+    done_file = DoneFile(done_path)
+
+    assert "fake_hash1" not in done_file
+    assert "fake_hash2" in done_file
+    assert "fake_hash3" in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_bloom_persisted(tmp_path, mocker):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    with DoneFile(done_path):
+        pass
+
+    rebuild = mocker.spy(SqliteHashSet, "_rebuild_bloom")
+
+    done_file = DoneFile(done_path)
+
+    rebuild.assert_not_called()
+    assert "fake_hash1" in done_file
+    assert "fake_hash2" not in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_bloom_saved_on_change(tmp_path, mocker):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    save = mocker.spy(BloomFilter, "as_buffer")
+
+    with DoneFile(done_path):
+        pass
+
+    with DoneFile(done_path):
+        pass
+
+    assert save.call_count == 1
+
+    with DoneFile(done_path) as done_file:
+        done_file.add("fake_hash1")
+
+    assert save.call_count == 1
+
+    with DoneFile(done_path) as done_file:
+        done_file.add("fake_hash2")
+
+    assert save.call_count == 2
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_bloom_stale(tmp_path, mocker):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    with DoneFile(done_path):
+        pass
+
+    with open(done_path, "a") as f:
+        f.write("fake_hash2\n")
+
+    # Index is synced, but the filter isn't saved
+    DoneFile(done_path)
+
+    rebuild = mocker.spy(SqliteHashSet, "_rebuild_bloom")
+
+    done_file = DoneFile(done_path)
+
+    rebuild.assert_called_once()
+    assert "fake_hash2" in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_bloom_grow(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    capacity = DoneFile(done_path).done_hashes._bloom.capacity
+
+    with open(done_path, "a") as f:
+        for i in range(capacity):
+            f.write(f"fake_hash_new{i}\n")
+
+    done_file = DoneFile(done_path)
+
+    assert done_file.done_hashes._bloom.capacity > capacity
+    assert "fake_hash1" in done_file
+    assert f"fake_hash_new{capacity - 1}" in done_file
+
+
+@pytest.mark.usefixtures("large_done_file")
+def test_sqlite_bloom_bad_size(tmp_path):
+    done_path = tmp_path / "done.txt"
+    done_path.write_text("fake_hash1\n")
+
+    with DoneFile(done_path) as done_file:
+        pass
+
+    done_hashes = done_file.done_hashes
+    done_hashes._db.execute("UPDATE bloom SET bits=x'00'")
+    done_hashes._db.commit()
+
+    assert "fake_hash1" in DoneFile(done_path)
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(100)
+
+    for i in range(100):
+        bloom.add(f"fake_hash{i}")
+
+    false_positives = sum(f"other_hash{i}" in bloom for i in range(1000))
+
+    assert all(f"fake_hash{i}" in bloom for i in range(100))
+    assert false_positives < 50
+
+
+def test_bloom_filter_restore():
+    bloom = BloomFilter(100)
+    bloom.add("fake_hash1")
+
+    restored = BloomFilter(100, bloom.as_buffer())
+
+    assert "fake_hash1" in restored
+    assert "fake_hash2" not in restored
@@ -4,7 +4,8 @@ from pathlib import Path
 
 from dateutil.tz import tzutc
 
-from enex2notion.enex_parser import iter_notes
+from enex2notion import enex_parser
+from enex2notion.enex_parser import iter_note_cursors, iter_notes
 from enex2notion.enex_types import EvernoteNote, EvernoteResource
 
 
@@ -447,6 +448,85 @@ def test_iter_notes_single_with_resource(fs):
     assert notes[0].resource_by_md5("000") is None
 
 
+def test_iter_notes_skip_predicate(fs, mocker):
+    test_enex = """<?xml version="1.0" encoding="UTF-8"?>
+    <!DOCTYPE en-export SYSTEM "http://xml.evernote.com/pub/evernote-export4.dtd">
+    <en-export export-date="20211218T085932Z" application="Evernote" version="10.25.6">
+      <note>
+        <title>test1</title>
+        <created>20211118T085332Z</created>
+        <updated>20211118T085920Z</updated>
+        <content>test</content>
+        <resource>
+          <data encoding="base64">
+            R0lGODlhAQABAAAAACwAAAAAAQABAAAC
+          </data>
+          <mime>image/gif</mime>
+        </resource>
+      </note>
+      <note>
+        <title>test2</title>
+        <created>20211118T085332Z</created>
+        <updated>20211118T085920Z</updated>
+        <content>test</content>
+      </note>
+    </en-export>
+    """
+    fs.create_file("test.enex", contents=test_enex)
+
+    convert_resource = mocker.spy(enex_parser, "_convert_resource")
+    skip_predicate = mocker.MagicMock(side_effect=lambda h, title: title == "test1")
+
+    notes = list(iter_notes(Path("test.enex"), skip_predicate=skip_predicate))
+
+    assert [n.title for n in notes] == ["test2"]
+    assert skip_predicate.call_args_list == [
+        mocker.call(mocker.ANY, "test1"),
+        mocker.call(notes[0].note_hash, "test2"),
+    ]
+    convert_resource.assert_not_called()
+
+
+def test_iter_note_cursors(fs, mocker):
+    test_enex = """<?xml version="1.0" encoding="UTF-8"?>
+    <!DOCTYPE en-export SYSTEM "http://xml.evernote.com/pub/evernote-export4.dtd">
+    <en-export export-date="20211218T085932Z" application="Evernote" version="10.25.6">
+      <note>
+        <title>test1</title>
+        <created>20211118T085332Z</created>
+        <updated>20211118T085920Z</updated>
+        <content>test</content>
+        <tag>tag1</tag>
+        <resource>
+          <data encoding="base64">
+            R0lGODlhAQABAAAAACwAAAAAAQABAAAC
+          </data>
+          <mime>image/gif</mime>
+          <resource-attributes>
+            <file-name>smallest.gif</file-name>
+          </resource-attributes>
+        </resource>
+      </note>
+    </en-export>
+    """
+    fs.create_file("test.enex", contents=test_enex)
+
+    convert_resource = mocker.spy(enex_parser, "_convert_resource")
+
+    cursors = list(iter_note_cursors(Path("test.enex")))
+
+    assert [(c.title, c.tags) for c in cursors] == [("test1", ["tag1"])]
+    convert_resource.assert_not_called()
+
+    note = cursors[0].materialize()
+
+    assert note == next(iter_notes(Path("test.enex")))
+    assert note.note_hash == cursors[0].note_hash
+    assert [r.file_name for r in note.resources] == ["smallest.gif"]
+    assert cursors[0].materialize() is note
+    assert convert_resource.call_count == 2
+
+
 def test_iter_notes_single_with_noext_resource(fs):
     test_enex = """<?xml version="1.0" encoding="UTF-8"?>
     <!DOCTYPE en-export SYSTEM "http://xml.evernote.com/pub/evernote-export4.dtd">
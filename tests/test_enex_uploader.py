@@ -1,22 +1,51 @@
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from datetime import datetime
 
 import pytest
 from dateutil.tz import tzutc
 from notion.block import CollectionViewPageBlock, FileBlock, PageBlock, TextBlock
+from notion.client import create_session
 from requests import HTTPError
 
 from enex2notion.enex_types import EvernoteNote
 from enex2notion.enex_uploader import (
     NoteUploadFailException,
+    _get_retry_after,
     get_import_root,
+    get_notion_client,
     upload_note,
 )
-from enex2notion.enex_uploader_modes import get_notebook_database, get_notebook_page
+from enex2notion.enex_uploader_modes import (
+    _make_notebook_db_schema,
+    get_notebook_database,
+    get_notebook_page,
+)
 from enex2notion.note_parser import parse_note
 
 
+@pytest.fixture()
+def test_note():
+    return EvernoteNote(
+        title="test1",
+        created=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
+        updated=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
+        content="<en-note><div>test</div></en-note>",
+        tags=[],
+        author="",
+        url="",
+        is_webclip=False,
+        resources=[],
+    )
+
+
+@pytest.fixture()
+def note_blocks(test_note):
+    return parse_note(test_note)
+
+
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
 def test_notebook_database(notion_test_page):
@@ -48,6 +77,8 @@ def test_notebook_database(notion_test_page):
 def test_notebook_database_existing(notion_test_page):
     test_database = get_notebook_database(notion_test_page, "test_database")
 
+    get_notebook_database.cache_clear()
+
     assert test_database == get_notebook_database(notion_test_page, "test_database")
 
 
@@ -64,6 +95,7 @@ def test_notebook_database_existing_no_options(notion_test_page):
 
     test_database.collection.set(f"schema.{tag_col_id}.options", None)
 
+    get_notebook_database.cache_clear()
     test_database = get_notebook_database(notion_test_page, "test_database")
 
     assert test_database.collection.get(f"schema.{tag_col_id}.options") == []
@@ -83,9 +115,43 @@ def test_notebook_page(notion_test_page):
 def test_notebook_page_existing(notion_test_page):
     test_page = get_notebook_page(notion_test_page, "test")
 
+    get_notebook_page.cache_clear()
+
     assert test_page == get_notebook_page(notion_test_page, "test")
 
 
+def test_notebook_page_cached(mocker):
+    root = mocker.MagicMock(id="fake_root")
+    root.children.__iter__.return_value = iter([])
+
+    try:
+        test_page = get_notebook_page(root, "test")
+
+        assert get_notebook_page(root, "test") is test_page
+        root.children.add_new.assert_called_once()
+
+        get_notebook_page.cache_clear()
+        get_notebook_page(root, "test")
+
+        assert root.children.add_new.call_count == 2
+    finally:
+        get_notebook_page.cache_clear()
+
+
+def test_notebook_page_cached_fail(mocker):
+    root = mocker.MagicMock(id="fake_root")
+    root.children.__iter__.return_value = iter([])
+    root.children.add_new.side_effect = [HTTPError, "fake_page"]
+
+    try:
+        with pytest.raises(HTTPError):
+            get_notebook_page(root, "test")
+
+        assert get_notebook_page(root, "test") == "fake_page"
+    finally:
+        get_notebook_page.cache_clear()
+
+
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
 def test_import_root(notion_test_page):
@@ -132,21 +198,7 @@ def test_empty_database_cleanup(notion_test_page):
 
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
-def test_upload_note(notion_test_page):
-    test_note = EvernoteNote(
-        title="test1",
-        created=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        updated=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        content="<en-note><div>test</div></en-note>",
-        tags=[],
-        author="",
-        url="",
-        is_webclip=False,
-        resources=[],
-    )
-
-    note_blocks = parse_note(test_note)
-
+def test_upload_note(notion_test_page, test_note, note_blocks):
     upload_note(notion_test_page, test_note, note_blocks)
 
     uploaded_page = notion_test_page.children[0]
@@ -158,21 +210,7 @@ def test_upload_note(notion_test_page):
 
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
-def test_upload_note_fail(notion_test_page, mocker):
-    test_note = EvernoteNote(
-        title="test1",
-        created=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        updated=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        content="<en-note><div>test</div></en-note>",
-        tags=[],
-        author="",
-        url="",
-        is_webclip=False,
-        resources=[],
-    )
-
-    note_blocks = parse_note(test_note)
-
+def test_upload_note_fail(notion_test_page, test_note, note_blocks, mocker):
     mocker.patch("enex2notion.enex_uploader.upload_block", side_effect=HTTPError)
 
     with pytest.raises(NoteUploadFailException):
@@ -183,21 +221,7 @@ def test_upload_note_fail(notion_test_page, mocker):
 
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
-def test_upload_note_fail_db(notion_test_page, mocker):
-    test_note = EvernoteNote(
-        title="test1",
-        created=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        updated=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        content="<en-note><div>test</div></en-note>",
-        tags=[],
-        author="",
-        url="",
-        is_webclip=False,
-        resources=[],
-    )
-
-    note_blocks = parse_note(test_note)
-
+def test_upload_note_fail_db(notion_test_page, test_note, note_blocks, mocker):
     test_database = get_notebook_database(notion_test_page, "test_database")
 
     mocker.patch("enex2notion.enex_uploader.upload_block", side_effect=HTTPError)
@@ -210,20 +234,14 @@ def test_upload_note_fail_db(notion_test_page, mocker):
 
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
-def test_upload_note_with_file(notion_test_page, tiny_file):
-    test_note = EvernoteNote(
-        title="test1",
-        created=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        updated=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
+def test_upload_note_with_file(notion_test_page, test_note, tiny_file):
+    test_note = replace(
+        test_note,
         content=(
             "<en-note>"
             f'<en-media type="{tiny_file.mime}" hash="{tiny_file.md5}" />'
             "</en-note>"
         ),
-        tags=[],
-        author="",
-        url="",
-        is_webclip=False,
         resources=[tiny_file],
     )
 
@@ -241,23 +259,13 @@ def test_upload_note_with_file(notion_test_page, tiny_file):
 
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
-def test_upload_note_db(notion_test_page):
-    test_note = EvernoteNote(
-        title="test1",
-        created=datetime(2021, 11, 18, 0, 0, 0, tzinfo=tzutc()),
-        updated=datetime(2021, 11, 19, 0, 0, 0, tzinfo=tzutc()),
-        content="<en-note><div>test</div></en-note>",
-        tags=[],
-        author="",
-        url="",
-        is_webclip=False,
-        resources=[],
+def test_upload_note_db(notion_test_page, test_note, note_blocks):
+    test_note = replace(
+        test_note, updated=datetime(2021, 11, 19, 0, 0, 0, tzinfo=tzutc())
     )
 
     test_database = get_notebook_database(notion_test_page, "test_database")
 
-    note_blocks = parse_note(test_note)
-
     upload_note(test_database, test_note, note_blocks)
 
     rows = list(test_database.collection.get_rows())
@@ -273,3 +281,108 @@ def test_upload_note_db(notion_test_page):
     assert len(test_row.children) == 1
     assert isinstance(test_row.children[0], TextBlock)
     assert test_row.children[0].title == "test"
+
+
+def test_upload_note_db_new_tags_workers(test_note, fake_notion_client, mocker):
+    db_id = "00000000-0000-0000-0000-000000000001"
+    collection_id = "00000000-0000-0000-0000-000000000002"
+    records = {
+        ("block", db_id): {
+            "type": "collection_view_page",
+            "format": {"collection_pointer": {"id": collection_id}},
+            "view_ids": [],
+        },
+        ("collection", collection_id): {
+            "parent_id": db_id,
+            "parent_table": "block",
+            "schema": _make_notebook_db_schema(),
+        },
+    }
+
+    roots = []
+    for _ in range(2):
+        client = fake_notion_client(records)
+        client.current_user = mocker.MagicMock(id="user")
+
+        # Each client caches the schema before any tags are added
+        root = client.get_block(db_id)
+        root.collection.get("schema")
+        roots.append(root)
+
+    notes = [
+        replace(test_note, tags=["tag1", "tag2"]),
+        replace(test_note, tags=["tag3"]),
+    ]
+
+    with ThreadPoolExecutor(2) as executor:
+        for future in [
+            executor.submit(upload_note, root, note, [], show_progress=False)
+            for root, note in zip(roots, notes)
+        ]:
+            future.result()
+
+    roots[0].collection.refresh()
+    tags_prop = roots[0].collection.get_schema_property("tags")
+    assert sorted(o["value"] for o in tags_prop["options"]) == [
+        "tag1",
+        "tag2",
+        "tag3",
+    ]
+
+
+@pytest.mark.parametrize(
+    "headers, retry_after",
+    [
+        ({}, None),
+        ({"Retry-After": "5"}, 5),
+        ({"Retry-After": "-5"}, 0),
+        ({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, 0),
+        ({"Retry-After": "bad"}, None),
+    ],
+)
+def test_retry_after(headers, retry_after, mocker):
+    response = mocker.MagicMock(headers=headers)
+
+    assert _get_retry_after(response) == retry_after
+
+
+def test_retry_after_future_date(mocker):
+    response = mocker.MagicMock(
+        headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    )
+    mock_datetime = mocker.patch("enex2notion.enex_uploader.datetime")
+    mock_datetime.now.return_value = datetime(2015, 10, 21, 7, 27, 0, tzinfo=tzutc())
+
+    assert _get_retry_after(response) == 60
+
+
+def test_retry_after_no_response():
+    assert _get_retry_after(None) is None
+
+
+def test_notion_client_pool(mocker):
+    session = create_session()
+    mocker.patch(
+        "enex2notion.enex_uploader.NotionClient",
+        return_value=mocker.MagicMock(session=session),
+    )
+    retries = session.get_adapter("https://").max_retries
+
+    client = get_notion_client("fake_token", pool_size=32)
+
+    adapter = client.session.get_adapter("https://")
+    assert adapter._pool_maxsize == 32
+    assert adapter.max_retries is retries
+
+
+def test_notion_client_pool_default(mocker):
+    session = create_session()
+    mocker.patch(
+        "enex2notion.enex_uploader.NotionClient",
+        return_value=mocker.MagicMock(session=session),
+    )
+    adapter = session.get_adapter("https://")
+
+    client = get_notion_client("fake_token", pool_size=4)
+
+    assert client.session.get_adapter("https://") is adapter
@@ -1,13 +1,25 @@
 import os
 import random
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
 
 import pytest
-from notion.block import FileBlock
+from notion.block import FileBlock, ImageBlock
+from notion.settings import S3_URL_PREFIX
+from requests import HTTPError
+from urllib3.util.retry import Retry
 
 from enex2notion.colors import COLORS_BG, COLORS_FG
 from enex2notion.enex_uploader import BadTokenException, get_notion_client
 from enex2notion.note_parser_blocks import parse_note_blocks
-from enex2notion.note_uploader import _sizeof_fmt, upload_block
+from enex2notion.note_uploader import (
+    S3_POOL_SIZE,
+    _create_s3_session,
+    _sizeof_fmt,
+    _upload_resource,
+    upload_block,
+    upload_files,
+)
 
 
 @pytest.mark.vcr()
@@ -117,6 +129,162 @@ def test_file_upload(parse_html, notion_test_page, tiny_file):
         assert child.size == "1B"
 
 
+def test_upload_block_single_transaction(
+    parse_html, smallest_gif, fake_notion_client, mocker
+):
+    test_note = parse_html(f'<en-media type="image/gif" hash="{smallest_gif.md5}" />')
+
+    test_block = parse_note_blocks(test_note)[0]
+    test_block.resource = smallest_gif
+    test_block.width = 100
+    test_block.height = 200
+    test_block.properties["properties.caption"] = [["test caption"]]
+
+    client = fake_notion_client()
+    block_id = "00000000-0000-0000-0000-000000000001"
+    root = mocker.MagicMock()
+    root.children.add_new.return_value = ImageBlock(client, block_id)
+
+    file_url = f"{S3_URL_PREFIX}file_id/{smallest_gif.file_name}"
+    mocker.patch(
+        "enex2notion.note_uploader._upload_resource",
+        return_value={"url": file_url},
+    )
+
+    upload_block(root, test_block)
+
+    assert len(client.transactions) == 1
+    assert {
+        (".".join(map(str, op["path"])), str(op["args"]))
+        for op in client.transactions[0]
+    } == {
+        ("format.block_width", "100"),
+        ("format.block_height", "200"),
+        ("properties.caption", "[['test caption']]"),
+        ("format.display_source", file_url),
+        ("properties.source", f"[['{file_url}']]"),
+        ("file_ids.0", "file_id"),
+    }
+    assert all(op["id"] == block_id for op in client.transactions[0])
+
+
+def test_upload_files(parse_html, tiny_file, mocker):
+    test_note = parse_html(
+        f'<en-media type="{tiny_file.mime}" hash="{tiny_file.md5}" />'
+        "<div>test</div>"
+        f'<en-media type="{tiny_file.mime}" hash="{tiny_file.md5}" />'
+    )
+
+    file_block, text_block, nested_file_block = parse_note_blocks(test_note)
+    text_block.children.append(nested_file_block)
+    file_block.resource = tiny_file
+    nested_file_block.resource = tiny_file
+
+    mock_upload = mocker.patch(
+        "enex2notion.note_uploader._upload_resource",
+        side_effect=lambda client, resource: {"url": resource.file_name},
+    )
+
+    uploads = upload_files(mocker.MagicMock(), [file_block, text_block], 4)
+
+    assert mock_upload.call_count == 2
+    assert uploads == {
+        id(file_block): {"url": tiny_file.file_name},
+        id(nested_file_block): {"url": tiny_file.file_name},
+    }
+
+
+def test_upload_files_no_files(parse_html, mocker):
+    mock_upload = mocker.patch("enex2notion.note_uploader._upload_resource")
+
+    test_blocks = parse_note_blocks(parse_html("<div>test</div>"))
+
+    assert upload_files(mocker.MagicMock(), test_blocks, 4) == {}
+    mock_upload.assert_not_called()
+
+
+def test_upload_files_fail(parse_html, tiny_file, mocker):
+    test_note = parse_html(
+        f'<en-media type="{tiny_file.mime}" hash="{tiny_file.md5}" />' * 3
+    )
+
+    test_blocks = parse_note_blocks(test_note)
+    for block in test_blocks:
+        block.resource = tiny_file
+
+    mocker.patch(
+        "enex2notion.note_uploader._upload_resource",
+        side_effect=[HTTPError, {"url": "ok"}, {"url": "ok"}],
+    )
+
+    with pytest.raises(HTTPError):
+        upload_files(mocker.MagicMock(), test_blocks, 1)
+
+
+def test_upload_resource_shared_session(tiny_file, mocker):
+    mock_put = mocker.patch("enex2notion.note_uploader._s3_session.put")
+
+    client = mocker.MagicMock()
+    client.post.return_value.json.return_value = {"signedPutUrl": "https://s3/put"}
+
+    _upload_resource(client, tiny_file)
+    _upload_resource(client, tiny_file)
+
+    assert mock_put.call_count == 2
+    mock_put.assert_called_with(
+        "https://s3/put",
+        data=tiny_file.data_bin,
+        headers={"Content-type": tiny_file.mime},
+    )
+
+
+def test_s3_session_pool():
+    adapter = _create_s3_session().get_adapter("https://")
+
+    assert adapter._pool_maxsize == S3_POOL_SIZE
+    assert 429 in adapter.max_retries.status_forcelist
+
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    requests_count = 0
+
+    def do_PUT(self):  # noqa: N802
+        UnavailableHandler.requests_count += 1
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        """Silence request logging"""
+
+
+def test_upload_resource_unavailable(tiny_file, mocker):
+    mocker.patch.object(Retry, "sleep")
+
+    server = HTTPServer(("127.0.0.1", 0), UnavailableHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    s3_session = _create_s3_session()
+    s3_session.mount("http://", s3_session.get_adapter("https://"))
+    mocker.patch("enex2notion.note_uploader._s3_session", s3_session)
+
+    client = mocker.MagicMock()
+    client.post.return_value.json.return_value = {
+        "signedPutUrl": f"http://127.0.0.1:{server.server_port}/put"
+    }
+
+    try:
+        with pytest.raises(HTTPError) as e:
+            _upload_resource(client, tiny_file)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert e.value.response.status_code == 503
+    assert UnavailableHandler.requests_count == 4
+
+
 @pytest.mark.vcr()
 @pytest.mark.usefixtures("vcr_uuid4")
 def test_table(parse_html, notion_test_page):